@@ -12,7 +12,7 @@ Action:
 
 Behavior:
 - Runs forever. Aligns to each 15m bar close (00, 15, 30, 45 past the hour).
-- Scans all USD-quoted products (no MAX cap).
+- Scans all USD-quoted products (no MAX cap), except stablecoin bases (see STABLECOINS).
 - Intentionally allows repeat buys whenever the signal is met.
 - Uses **closed-only** candles to match charting platforms.
 
@@ -34,9 +34,26 @@ MAX_PRODUCTS=0                     # 0 = scan ALL USD products (no limit)
 DENYLIST=
 ALLOWLIST=
 
+# Cheap prefilters applied before any candles are fetched:
+MIN_VOLUME_USD=0                   # skip markets with less 24h quote volume (0 = off)
+STABLECOINS=USDC,USDT,DAI,PYUSD,GUSD  # bases skipped unless allowlisted (empty = scan them too)
+
 # How often to refresh product list (seconds):
 PRODUCT_REFRESH_SECS=3600
 
+# Concurrent candle fetches per bar (thread pool size):
+SCAN_WORKERS=16
+ORDER_WORKERS=8                    # concurrent order submissions per bar
+
+# Request-rate caps (token buckets; 0 = unlimited; halved for 60s after a 429):
+PUBLIC_RPS=8
+PRIVATE_RPS=12
+
+# On-disk product catalog cache, reused across restarts (seconds; 0 = off):
+PRODUCTS_TTL=600
+PRODUCTS_CACHE_PATH=/tmp/cb_products.json
+PRODUCTS_STALE_SECS=86400          # fallback max age when the live catalog fetch fails
+
 # Set DEBUG=1 to see per-asset metrics each bar:
 DEBUG=1
 
@@ -45,18 +62,36 @@ STRICT_CLOSED_ONLY=1
 
 Requires
 --------
-pip install coinbase-advanced-py>=1.6.3 requests>=2.32.0
+pip install coinbase-advanced-py>=1.6.3 requests>=2.32.0 numpy>=1.26
+pip install orjson                 # optional, faster JSON (candles, disk caches)
 """
 
+import functools
+import json
 import os
+import sys
+import threading
 import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from decimal import Decimal, InvalidOperation, ROUND_DOWN
 from typing import Any, Dict, List, Optional, Tuple
 
+import numpy as np
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from coinbase.rest import RESTClient
 
+try:
+    import orjson
+    _json_loads = orjson.loads
+    _json_dumps = orjson.dumps
+except ImportError:  # optional; stdlib json is fine, just slower
+    _json_loads = json.loads
+    def _json_dumps(obj: Any) -> bytes:
+        return json.dumps(obj).encode()
+
 # ---------------- Config ----------------
 BUY_PCT_STR     = os.getenv("BUY_PCT", "0.05").strip()
 BUY_USD_STR     = os.getenv("BUY_USD", "0").strip()
@@ -64,30 +99,55 @@ QUOTE           = os.getenv("QUOTE_CURRENCY", "USD").upper().strip()
 PORTFOLIO_UUID  = os.getenv("PORTFOLIO_UUID", "").strip()
 PORTFOLIO_NAME  = os.getenv("PORTFOLIO_NAME", "bot").strip() if not PORTFOLIO_UUID else ""
 MAX_PRODUCTS    = int(os.getenv("MAX_PRODUCTS", "0"))  # 0 = no cap
-DENYLIST        = {s.strip().upper() for s in os.getenv("DENYLIST", "").split(",") if s.strip()}
+DENYLIST        = frozenset(s.strip().upper() for s in os.getenv("DENYLIST", "").split(",") if s.strip())
 ALLOWLIST_RAW   = os.getenv("ALLOWLIST", "").strip()
-ALLOWLIST       = {s.strip().upper() for s in ALLOWLIST_RAW.split(",") if s.strip()} if ALLOWLIST_RAW else set()
+ALLOWLIST       = frozenset(s.strip().upper() for s in ALLOWLIST_RAW.split(",") if s.strip()) if ALLOWLIST_RAW else frozenset()
+STABLECOINS     = frozenset(s.strip().upper() for s in os.getenv("STABLECOINS", "USDC,USDT,DAI,PYUSD,GUSD").split(",") if s.strip())
+MIN_VOLUME_USD  = float(os.getenv("MIN_VOLUME_USD", "0"))  # 24h volume * price; 0 = no floor
 PRODUCT_REFRESH_SECS = int(os.getenv("PRODUCT_REFRESH_SECS", "3600"))
+SCAN_WORKERS    = int(os.getenv("SCAN_WORKERS", "16"))  # concurrent candle fetches
+ORDER_WORKERS   = int(os.getenv("ORDER_WORKERS", "8"))  # concurrent order submissions
+PUBLIC_RPS      = float(os.getenv("PUBLIC_RPS", "8"))    # Exchange public API (candles)
+PRIVATE_RPS     = float(os.getenv("PRIVATE_RPS", "12"))  # Advanced Trade private API (all SDK calls)
+PRODUCTS_TTL    = int(os.getenv("PRODUCTS_TTL", "600"))  # 0 = no on-disk products cache
+PRODUCTS_CACHE_PATH = os.getenv("PRODUCTS_CACHE_PATH", "/tmp/cb_products.json")
+PRODUCTS_STALE_SECS = int(os.getenv("PRODUCTS_STALE_SECS", "86400"))  # max cache age used if the live fetch fails
 DEBUG           = os.getenv("DEBUG", "0").lower() not in ("0", "false", "no", "off", "")
 STRICT_CLOSED_ONLY = os.getenv("STRICT_CLOSED_ONLY", "1").lower() not in ("0","false","no","off","")
 
 client = RESTClient()  # uses COINBASE_API_KEY / COINBASE_API_SECRET
 
 # ---------------- Logging ----------------
+# Scan workers log concurrently: emit each line as one write under a lock so lines never interleave.
+_LOG_LOCK = threading.Lock()
+
+def _emit(line: str) -> None:
+    with _LOG_LOCK:
+        sys.stdout.write(line + "\n")
+        sys.stdout.flush()
+
 def log(msg: str) -> None:
-    print(f"[cb-rsi-buyer-live] {msg}", flush=True)
+    _emit(f"[cb-rsi-buyer-live] {msg}")
 
 def dbg(msg: str) -> None:
     if DEBUG:
-        print(f"[cb-rsi-buyer-live][debug] {msg}", flush=True)
+        _emit(f"[cb-rsi-buyer-live][debug] {msg}")
 
 def fmt_ts(ts: int) -> str:
     return time.strftime("%Y-%m-%d %H:%M:%S UTC", time.gmtime(ts))
 
 # ---------------- Helpers ----------------
+@functools.lru_cache(maxsize=4096)
+def _D_str(s: str) -> Decimal:
+    # Increment/min-size strings ("0.01", "1", ...) repeat across the catalog; Decimal is immutable.
+    return Decimal(s)
+
 def D(x: str | Decimal | float | int) -> Decimal:
+    if isinstance(x, Decimal):
+        return x
     try:
-        return Decimal(str(x))
+        # API payloads are already strings; only stringify floats/ints (avoids binary-float digits).
+        return _D_str(x) if isinstance(x, str) else Decimal(str(x))
     except InvalidOperation:
         raise SystemExit(f"Invalid decimal: {x}")
 
@@ -96,97 +156,306 @@ def _get(o: Any, k: str, default=None):
         return o.get(k, default)
     return getattr(o, k, default)
 
+PRODUCT_FIELDS = (
+    "product_id", "base_currency_id", "base_currency", "quote_currency_id", "quote_currency",
+    "status", "status_message", "is_tradable", "volume_24h", "price",
+    "price_increment", "base_increment", "quote_increment", "quote_min_size",
+)
+
+def _as_dict(o: Any, fields: Tuple[str, ...]) -> dict:
+    """Normalize an SDK object to a plain dict once, so hot loops can use dict.get()."""
+    if isinstance(o, dict):
+        return o
+    return {k: getattr(o, k) for k in fields if hasattr(o, k)}
+
+def _read_json_cache(path: str, max_age: float) -> Optional[Any]:
+    """Return the items of a {ts, items} cache file if it is younger than max_age seconds."""
+    try:
+        with open(path, "rb") as f:
+            blob = _json_loads(f.read())
+        if time.time() - float(blob["ts"]) < max_age:
+            return blob["items"]
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    return None
+
+def _write_json_cache(path: str, items: Any) -> None:
+    """Atomically write a {ts, items} cache file (tmpfile + rename)."""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "wb") as f:
+            f.write(_json_dumps({"ts": time.time(), "items": items}))
+        os.replace(tmp, path)
+    except (OSError, TypeError, ValueError) as e:
+        dbg(f"cache write failed ({path}): {e}")
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+
 def ensure_portfolio_uuid() -> Optional[str]:
-    """Return portfolio UUID; prefer env, else look up by name."""
+    """Return portfolio UUID; prefer env, else look up by name (name->uuid map, first match wins)."""
     global PORTFOLIO_UUID
     if PORTFOLIO_UUID:
         return PORTFOLIO_UUID
+    # Not persisted across restarts: a name-keyed disk cache would outlive a recreated
+    # portfolio or an API-key switch and route orders to the wrong UUID.
     try:
-        res = client.get("/api/v3/brokerage/portfolios")
+        res = _retry(client.get, "/api/v3/brokerage/portfolios")
         ports = _get(res, "portfolios") or _get(res, "data") or []
+        by_name: Dict[str, str] = {}
         for p in ports:
-            if str(_get(p, "name") or "").strip().lower() == PORTFOLIO_NAME.lower():
-                PORTFOLIO_UUID = _get(p, "uuid") or _get(p, "portfolio_uuid")
-                if PORTFOLIO_UUID:
-                    log(f"Using portfolio '{PORTFOLIO_NAME}' ({PORTFOLIO_UUID})")
-                    return PORTFOLIO_UUID
-        log(f"Portfolio named '{PORTFOLIO_NAME}' not found; order will be unscoped (default portfolio).")
+            p = _as_dict(p, ("name", "uuid", "portfolio_uuid"))
+            uid = p.get("uuid") or p.get("portfolio_uuid")
+            if uid:
+                by_name.setdefault(str(p.get("name") or "").strip().lower(), uid)
     except Exception as e:
         log(f"Error listing portfolios: {e}")
+        return None
+    PORTFOLIO_UUID = by_name.get(PORTFOLIO_NAME.lower())
+    if PORTFOLIO_UUID:
+        log(f"Using portfolio '{PORTFOLIO_NAME}' ({PORTFOLIO_UUID})")
+        return PORTFOLIO_UUID
+    log(f"Portfolio named '{PORTFOLIO_NAME}' not found; order will be unscoped (default portfolio).")
     return None
 
+# ---------------- Rate limiting ----------------
+class TokenBucket:
+    """Thread-safe token bucket; acquire() only sleeps when the rate would be exceeded."""
+
+    def __init__(self, rate: float, burst: float) -> None:
+        self.rate = float(rate)
+        self.capacity = float(max(burst, 1.0))
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._slow_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            rate = self.rate / 2 if now < self._slow_until else self.rate
+            self._tokens = min(self.capacity, self._tokens + (now - self._last) * rate)
+            self._last = now
+            self._tokens -= 1.0
+            # A negative balance reserves a future slot; later callers queue behind it.
+            wait = -self._tokens / rate if self._tokens < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
+
+    def penalize(self, secs: float = 60.0) -> None:
+        """Run at half rate for the next `secs` seconds (called on HTTP 429)."""
+        if self.rate <= 0:
+            return
+        with self._lock:
+            self._slow_until = max(self._slow_until, time.monotonic() + secs)
+
+PUBLIC_RL = TokenBucket(PUBLIC_RPS, PUBLIC_RPS)
+PRIVATE_RL = TokenBucket(PRIVATE_RPS, PRIVATE_RPS)
+
+# ---------------- Retries ----------------
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+def _retry(fn, *args, _tries: int = 4, _base: float = 0.35, _idempotent: bool = True,
+           _rl: Optional[TokenBucket] = PRIVATE_RL, **kwargs):
+    """
+    Call fn(*args, **kwargs), retrying transient HTTP failures with exponential backoff.
+    Every attempt takes a token from _rl (private API bucket by default); a 429 also
+    halves that bucket's rate for a minute. Honors Retry-After. Non-idempotent calls
+    (order POSTs) only retry on 429, where the request was rejected before being processed.
+    """
+    for i in range(_tries):
+        if _rl is not None:
+            _rl.acquire()
+        try:
+            return fn(*args, **kwargs)
+        except requests.exceptions.RequestException as e:
+            resp = getattr(e, "response", None)
+            status = getattr(resp, "status_code", None)
+            if status == 429 and _rl is not None:
+                _rl.penalize()
+            if _idempotent:
+                transient = status in RETRY_STATUSES or (
+                    status is None and isinstance(e, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+                )
+            else:
+                transient = status == 429
+            if not transient or i == _tries - 1:
+                raise
+            try:
+                retry_after = float(resp.headers.get("Retry-After") or 0) if resp is not None else 0.0
+            except (TypeError, ValueError):
+                retry_after = 0.0
+            delay = max(retry_after, _base * 2 ** i)
+            dbg(f"{getattr(fn, '__name__', 'call')} failed ({status or type(e).__name__}); retry {i + 1} in {delay:.2f}s")
+            time.sleep(delay)
+
 # --------- Increments / balances for correct notional sizing ----------
+@functools.lru_cache(maxsize=256)
 def get_product_meta(pid: str) -> Dict[str, Decimal]:
-    p = client.get_product(product_id=pid)
+    """Fetch increments for one product (cached; cleared on product refresh)."""
+    p = _retry(client.get_product, product_id=pid)
     qmin = getattr(p, "quote_min_size", None)
+    quote_inc = D(getattr(p, "quote_increment", "0"))
     return {
         "price_inc": D(getattr(p, "price_increment", "0")),
         "base_inc":  D(getattr(p, "base_increment", "0")),
-        "quote_inc": D(getattr(p, "quote_increment", "0")),
+        "quote_inc": quote_inc,
+        "quote_dec": quote_decimals(quote_inc),
         "base_ccy":  getattr(p, "base_currency_id"),
         "quote_ccy": getattr(p, "quote_currency_id"),
         "quote_min": D(qmin) if qmin is not None else D("0"),
     }
 
+def _dec_or_none(x: Any) -> Optional[Decimal]:
+    """Parse a catalog field as Decimal; None if missing, empty or malformed (unlike D(), never exits)."""
+    if x is None or x == "":
+        return None
+    try:
+        return x if isinstance(x, Decimal) else Decimal(x if isinstance(x, str) else str(x))
+    except (InvalidOperation, TypeError, ValueError):
+        return None
+
+def get_product_meta_from_dict(p: dict) -> Optional[Dict[str, Decimal]]:
+    """Same shape as get_product_meta, read from a catalog row; None if increments are missing or bad."""
+    if not p.get("quote_increment") or not (p.get("quote_currency_id") or p.get("quote_currency")):
+        return None
+    quote_inc = _dec_or_none(p.get("quote_increment"))
+    qmin_raw = p.get("quote_min_size")
+    qmin = _dec_or_none(qmin_raw)
+    if quote_inc is None or (qmin is None and qmin_raw not in (None, "")):
+        dbg(f"{p.get('product_id')} | malformed increments in catalog row; using get_product_meta")
+        return None
+    return {
+        "price_inc": _dec_or_none(p.get("price_increment")) or Decimal(0),
+        "base_inc":  _dec_or_none(p.get("base_increment")) or Decimal(0),
+        "quote_inc": quote_inc,
+        "quote_dec": quote_decimals(quote_inc),
+        "base_ccy":  p.get("base_currency_id") or p.get("base_currency"),
+        "quote_ccy": p.get("quote_currency_id") or p.get("quote_currency"),
+        "quote_min": qmin if qmin is not None else Decimal(0),
+    }
+
+def build_product_meta(products: List[dict]) -> Dict[str, Dict[str, Decimal]]:
+    """Parse increments for the whole catalog once per refresh (product_id -> meta)."""
+    metas: Dict[str, Dict[str, Decimal]] = {}
+    for p in products:
+        m = get_product_meta_from_dict(p)
+        if m is not None:
+            metas[p["product_id"]] = m
+    return metas
+
 def round_to_inc(value: Decimal, inc: Decimal) -> Decimal:
     if inc is None or inc <= 0:
         return value
     return (value / inc).to_integral_value(rounding=ROUND_DOWN) * inc
 
-def get_quote_available(quote_ccy: str) -> Decimal:
-    accs = client.get_accounts()
+def quote_decimals(inc: Decimal) -> Optional[int]:
+    """Number of decimal places implied by a quote increment (None if unknown)."""
+    if inc is None or inc <= 0:
+        return None
+    return max(0, -inc.normalize().as_tuple().exponent)
+
+def get_available_balances() -> Dict[str, Decimal]:
+    """Available balance per currency from a single get_accounts call."""
+    accs = _retry(client.get_accounts)
+    bals: Dict[str, Decimal] = {}
     for a in getattr(accs, "accounts", []):
-        if getattr(a, "currency", "").upper() == quote_ccy:
+        ccy = str(getattr(a, "currency", "") or "").upper()
+        if ccy and ccy not in bals:  # first account wins, as the old linear scan did
             vb = a.available_balance
-            return D(vb["value"] if isinstance(vb, dict) else vb)
-    return D("0")
+            bals[ccy] = D(vb["value"] if isinstance(vb, dict) else vb)
+    return bals
 
 # ---------------- Advanced Trade: products (paginated) ----------------
+def _load_products_cache(max_age: Optional[float] = None) -> Optional[List[dict]]:
+    """Return the cached product catalog if it is younger than max_age (default PRODUCTS_TTL)."""
+    if PRODUCTS_TTL <= 0:
+        return None
+    return _read_json_cache(PRODUCTS_CACHE_PATH, PRODUCTS_TTL if max_age is None else max_age)
+
+def _save_products_cache(items: List[dict]) -> None:
+    if PRODUCTS_TTL > 0:
+        _write_json_cache(PRODUCTS_CACHE_PATH, items)
+
 def fetch_all_products() -> List[dict]:
+    cached = _load_products_cache()
+    if cached is not None:
+        dbg(f"Products loaded from cache: {len(cached)}")
+        return cached
+
     items: List[dict] = []
     cursor = None
     while True:
         params = {"limit": 250}
         if cursor:
             params["cursor"] = cursor
-        res = client.get("/api/v3/brokerage/products", params=params)
+        res = _retry(client.get, "/api/v3/brokerage/products", params=params)
         page = _get(res, "products") or _get(res, "data") or []
         items.extend(page)
         cursor = _get(res, "cursor") or _get(res, "next") or _get(res, "next_cursor")
-        if not cursor:
+        # One call covers the whole catalog in practice; stop on a missing cursor or a
+        # short/empty page rather than paying for an extra empty round-trip.
+        if not cursor or len(page) < params["limit"]:
             break
+    _save_products_cache(items)
     return items
 
 def fetch_usd_products() -> List[dict]:
     """Get tradable online USD products (optionally honor allow/deny lists), sorted by 24h volume."""
     try:
         prods = fetch_all_products()
-    except Exception:
-        res = client.get_products()
-        prods = _get(res, "products") or _get(res, "data") or res
-
-    usd_products: List[dict] = []
+    except Exception as e:
+        # The catalog changes slowly; a stale cached copy beats another full listing call.
+        prods = _load_products_cache(max_age=PRODUCTS_STALE_SECS)
+        if prods is not None:
+            log(f"Product fetch failed ({e}); using cached catalog ({len(prods)} products)")
+        else:
+            res = _retry(client.get_products)
+            prods = _get(res, "products") or _get(res, "data") or res
+
+    suffix = f"-{QUOTE}"
+    ranked: List[Tuple[float, dict]] = []
     for p in prods:
-        pid    = str(_get(p, "product_id") or "")
-        quote  = str(_get(p, "quote_currency_id") or _get(p, "quote_currency") or "").upper()
-        base   = str(_get(p, "base_currency_id")  or _get(p, "base_currency")  or "").upper()
-        status = str(_get(p, "status") or _get(p, "status_message") or "online").lower()
-        tradable = bool(_get(p, "is_tradable", True))
-        if not pid or quote != QUOTE or not tradable or "offline" in status:
+        p = _as_dict(p, PRODUCT_FIELDS)
+        pid    = str(p.get("product_id") or "").upper()
+        if not pid.endswith(suffix):  # cheap reject before the other field lookups
+            continue
+        quote  = str(p.get("quote_currency_id") or p.get("quote_currency") or "").upper()
+        base   = str(p.get("base_currency_id")  or p.get("base_currency")  or "").upper()
+        status = str(p.get("status") or p.get("status_message") or "online").lower()
+        tradable = bool(p.get("is_tradable", True))
+        if not base or quote != QUOTE or not tradable or "offline" in status:
             continue
         if ALLOWLIST and base not in ALLOWLIST:
             continue
         if base in DENYLIST:
             continue
-        usd_products.append(p)
-
-    def dec(v) -> Decimal:
+        if base in STABLECOINS and base not in ALLOWLIST:  # an explicit allowlist entry wins
+            continue
+        # Ranking only (not money), so plain floats are enough here.
         try:
-            return D(str(v))
-        except Exception:
-            return Decimal(0)
-
-    usd_products.sort(key=lambda p: dec(_get(p, "volume_24h")), reverse=True)
+            vol24 = float(p.get("volume_24h") or 0.0)
+        except (TypeError, ValueError):
+            vol24 = 0.0
+        if MIN_VOLUME_USD > 0:
+            # volume_24h is in base units; rows without a price are kept (can't judge them).
+            try:
+                price = float(p.get("price") or 0.0)
+            except (TypeError, ValueError):
+                price = 0.0
+            if price > 0 and vol24 * price < MIN_VOLUME_USD:
+                continue
+        # Keep only the fields the bot reads (the raw catalog rows carry dozens more),
+        # with ids normalized here so the per-bar paths can index them directly.
+        row = {k: p[k] for k in PRODUCT_FIELDS if k in p}
+        row.update(product_id=pid, base_currency_id=base, quote_currency_id=quote)
+        ranked.append((vol24, row))
+
+    ranked.sort(key=lambda vp: vp[0], reverse=True)
+    usd_products = [p for _, p in ranked]
     if MAX_PRODUCTS and MAX_PRODUCTS > 0 and len(usd_products) > MAX_PRODUCTS:
         usd_products = usd_products[:MAX_PRODUCTS]
 
@@ -196,19 +465,35 @@ def fetch_usd_products() -> List[dict]:
 # ---------------- Exchange public API: 15m candles (CLOSED ONLY) ----------------
 EXCHANGE_BASE = "https://api.exchange.coinbase.com"
 FIFTEEN_MIN = 900
+NO_CANDLES = np.empty((0, 6), dtype=np.float64)
+
+# One pooled keep-alive session for all candle fetches (pool sized for the scan workers).
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=max(32, SCAN_WORKERS),
+    pool_maxsize=max(32, SCAN_WORKERS),
+    max_retries=Retry(total=3, backoff_factor=0.2, status_forcelist=(429, 500, 502, 503, 504)),
+))
+_SESSION.headers.update({"User-Agent": "cb-rsi-buyer-live/1.0", "Accept": "application/json"})
+
+def _bucket(ts: int) -> int:
+    """Start of the 15m bar containing ts."""
+    return ts - ts % FIFTEEN_MIN
 
 def last_closed_bar_boundary(ts: Optional[int] = None) -> int:
     """Return the UNIX epoch for the *start* of the most recently CLOSED 15m bar."""
-    if ts is None:
-        ts = int(time.time())
-    current_bucket = (ts // FIFTEEN_MIN) * FIFTEEN_MIN
-    return current_bucket - FIFTEEN_MIN
+    return _bucket(int(time.time()) if ts is None else ts) - FIFTEEN_MIN
 
-def get_candles_15m(pid: str, bars_needed: int = 300) -> List[Tuple[int, float, float, float, float, float]]:
+# Per-product candle history, so each bar only the tail since the newest cached candle is fetched.
+_CANDLE_CACHE: Dict[str, np.ndarray] = {}
+
+def get_candles_15m(pid: str, bars_needed: int = 300) -> np.ndarray:
     """
-    Return recent 15m candles for product_id, oldest -> newest.
-    Each item: (time, low, high, open, close, volume)
+    Return recent 15m candles for product_id as an (n, 6) float64 array, oldest -> newest.
+    Columns: time, low, high, open, close, volume
     Uses **closed-only** candles if STRICT_CLOSED_ONLY is True.
+    The full window is downloaded once per product; later bars fetch only the tail from the
+    newest cached bar and merge it in, replacing cached rows only where the response overlaps.
     """
     granularity = FIFTEEN_MIN
 
@@ -219,74 +504,121 @@ def get_candles_15m(pid: str, bars_needed: int = 300) -> List[Tuple[int, float,
 
     start_ts = end_ts - granularity * max(bars_needed, 300)
 
-    params = {"granularity": granularity, "start": start_ts, "end": end_ts}
+    cached = _CANDLE_CACHE.get(pid)
+    if cached is not None and len(cached) and cached[-1, 0] >= start_ts:
+        # Re-fetch from the newest cached bar (inclusive) so a still-forming bar gets replaced.
+        fetch_from = int(cached[-1, 0])
+    else:
+        cached, fetch_from = None, start_ts
+
+    params = {"granularity": granularity, "start": fetch_from, "end": end_ts}
     url = f"{EXCHANGE_BASE}/products/{pid}/candles"
-    headers = {"User-Agent": "cb-rsi-buyer-live/1.0", "Accept": "application/json"}
 
     try:
-        r = requests.get(url, headers=headers, params=params, timeout=20)
+        PUBLIC_RL.acquire()
+        r = _SESSION.get(url, params=params, timeout=(5, 20))  # fail fast on connect, allow slow reads
+        # The adapter retries 429s itself; still slow the shared bucket down if it had to.
+        retries = getattr(r.raw, "retries", None)
+        if r.status_code == 429 or any(h.status == 429 for h in getattr(retries, "history", ())):
+            PUBLIC_RL.penalize()
         r.raise_for_status()
-        data = r.json()
+        data = _json_loads(r.content)
         if not isinstance(data, list):
-            return []
-        data.sort(key=lambda x: x[0])  # oldest first
+            return NO_CANDLES
+        if data:
+            new = np.asarray(data, dtype=np.float64)
+            if new.ndim != 2 or new.shape[1] != 6:
+                return NO_CANDLES
+            # The API returns newest first: reversing is enough; sort only if it's neither order.
+            if new[0, 0] > new[-1, 0]:
+                new = new[::-1]
+            if np.any(new[1:, 0] < new[:-1, 0]):
+                new = new[np.argsort(new[:, 0], kind="stable")]
+        else:
+            # Nothing returned: skip this product for the bar (as a full fetch would) and keep
+            # the cached history untouched for the next one.
+            return NO_CANDLES
+
+        arr = new if cached is None else np.concatenate((cached[cached[:, 0] < new[0, 0]], new))
+        arr = arr[arr[:, 0] >= start_ts]
 
         # Extra guard: drop any candle at or after end_ts (shouldn't appear, but be safe)
         if STRICT_CLOSED_ONLY:
-            data = [row for row in data if int(row[0]) < end_ts]
+            arr = arr[arr[:, 0] < end_ts]
 
-        return [(int(t), float(lo), float(hi), float(op), float(cl), float(v)) for t, lo, hi, op, cl, v in data]
+        _CANDLE_CACHE[pid] = arr
+        return arr
     except Exception as e:
+        if isinstance(e, requests.exceptions.RetryError):  # adapter gave up (e.g. persistent 429)
+            PUBLIC_RL.penalize()
         dbg(f"{pid} | candles fetch error: {e}")
-        return []
+        return NO_CANDLES
 
 # ---------------- Indicators (RSI, SMA) ----------------
-def sma(values: List[float], length: int) -> Optional[float]:
-    if len(values) < length:
-        return None
-    return sum(values[-length:]) / float(length)
+# Indicators run on a right-aligned (N_products, T) closes matrix: row i holds counts[i]
+# real closes at its right end, NaN padding on the left.
+MIN_BARS = 240 + 14 + 1
 
-def rsi_wilder_14(closes: List[float], length: int = 14) -> Optional[float]:
-    """Wilder's RSI(14) on closes; returns latest RSI value."""
-    if len(closes) < length + 1:
+def sma(closes: np.ndarray, length: int) -> Optional[np.ndarray]:
+    """SMA of the last `length` closes, one value per row."""
+    if closes.shape[-1] < length:
         return None
-    gains: List[float] = []
-    losses: List[float] = []
-    for i in range(1, length + 1):
-        diff = closes[i] - closes[i - 1]
-        gains.append(max(diff, 0.0))
-        losses.append(max(-diff, 0.0))
-    avg_gain = sum(gains) / length
-    avg_loss = sum(losses) / length
-    for i in range(length + 1, len(closes)):
-        diff = closes[i] - closes[i - 1]
-        gain = max(diff, 0.0)
-        loss = max(-diff, 0.0)
-        avg_gain = (avg_gain * (length - 1) + gain) / length
-        avg_loss = (avg_loss * (length - 1) + loss) / length
-    if avg_loss == 0:
-        return 100.0
-    rs = avg_gain / avg_loss
-    return 100.0 - (100.0 / (1.0 + rs))
+    return closes[..., -length:].mean(axis=-1)
+
+def rsi_wilder_14(closes: np.ndarray, counts: np.ndarray, length: int = 14) -> np.ndarray:
+    """
+    Wilder's RSI(14) per row; returns the latest RSI value of each row.
+    Every row must have at least length + 1 real closes.
+    """
+    n, t = closes.shape
+    diff = np.diff(closes, axis=1)
+    gains = np.maximum(diff, 0.0)
+    losses = np.maximum(-diff, 0.0)
+
+    # Seed with the mean of each row's first `length` real diffs.
+    first = t - counts
+    rows = np.arange(n)[:, None]
+    seed = first[:, None] + np.arange(length)
+    avg_gain = gains[rows, seed].mean(axis=1)
+    avg_loss = losses[rows, seed].mean(axis=1)
+
+    # Only the final average is needed, so unroll the recurrence
+    # avg = decay * avg + x / length into a decayed sum instead of looping over time:
+    # avg_end = decay**steps * seed + sum_j decay**(t-2-j) * x_j / length.
+    decay = (length - 1) / length
+    begin = first + length
+    cols = np.arange(t - 1)
+    live = cols >= begin[:, None]
+    weights = decay ** (t - 2 - cols) / length
+    carry = decay ** ((t - 1) - begin)
+    avg_gain = carry * avg_gain + np.where(live, gains, 0.0) @ weights
+    avg_loss = carry * avg_loss + np.where(live, losses, 0.0) @ weights
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rsi = 100.0 - (100.0 / (1.0 + avg_gain / avg_loss))
+    return np.where(avg_loss == 0, 100.0, rsi)
 
 # ---------------- Trading (Advanced Trade) ----------------
-def _make_order_payload(product_id: str, usd_amount: Decimal) -> dict:
+def _make_order_payload(product_id: str, usd_amount: Decimal, q_decimals: Optional[int] = None) -> dict:
+    # Fixed-point at the quote increment's precision; amounts are already rounded down to it.
+    quote_size = f"{usd_amount:.{q_decimals}f}" if q_decimals is not None else f"{usd_amount.normalize():f}"
     return {
         "product_id": product_id,
         "side": "BUY",
         "client_order_id": str(uuid.uuid4()),
         "order_configuration": {
-            "market_market_ioc": {"quote_size": f"{usd_amount.normalize():f}"}
+            "market_market_ioc": {"quote_size": quote_size}
         },
     }
 
-def place_market_buy(product_id: str, usd_amount: Decimal, portfolio_uuid: Optional[str]) -> None:
+def place_market_buy(product_id: str, usd_amount: Decimal, portfolio_uuid: Optional[str],
+                     q_decimals: Optional[int] = None) -> None:
     params = {}
     if portfolio_uuid:
         params["portfolio_id"] = portfolio_uuid
-    payload = _make_order_payload(product_id, usd_amount)
+    payload = _make_order_payload(product_id, usd_amount, q_decimals)
     try:
-        resp = client.post("/api/v3/brokerage/orders", params=params, data=payload)
+        resp = _retry(client.post, "/api/v3/brokerage/orders", params=params, data=payload, _idempotent=False)
         oid = (_get(resp, "order_id") or _get(resp, "orderId")
                or _get(_get(resp, "success_response", {}) or {}, "order_id"))
         log(f"{product_id} | BUY ${usd_amount} submitted (order {oid})")
@@ -294,8 +626,12 @@ def place_market_buy(product_id: str, usd_amount: Decimal, portfolio_uuid: Optio
         msg = str(e)
         if "client_order_id" in msg:
             dbg(f"{product_id} | retrying with fresh client_order_id due to error: {e}")
-            payload = _make_order_payload(product_id, usd_amount)
-            resp = client.post("/api/v3/brokerage/orders", params=params, data=payload)
+            payload = _make_order_payload(product_id, usd_amount, q_decimals)
+            try:
+                resp = _retry(client.post, "/api/v3/brokerage/orders", params=params, data=payload, _idempotent=False)
+            except Exception as e2:
+                log(f"{product_id} | BUY failed on retry: {type(e2).__name__}: {e2}")
+                raise
             oid = (_get(resp, "order_id") or _get(resp, "orderId")
                    or _get(_get(resp, "success_response", {}) or {}, "order_id"))
             log(f"{product_id} | BUY ${usd_amount} submitted on retry (order {oid})")
@@ -306,10 +642,7 @@ def place_market_buy(product_id: str, usd_amount: Decimal, portfolio_uuid: Optio
 # ---------------- Scheduling: align to 15m bars ----------------
 def next_bar_epoch(now: Optional[int] = None) -> int:
     """Return the UNIX epoch for the *next* 15m bar boundary."""
-    FIFTEEN_MIN = 900
-    if now is None:
-        now = int(time.time())
-    return ((now // FIFTEEN_MIN) + 1) * FIFTEEN_MIN
+    return _bucket(int(time.time()) if now is None else now) + FIFTEEN_MIN
 
 def sleep_until(ts: int, pad_seconds: int = 2) -> None:
     """Sleep until ts + small pad; candles fetch still uses last CLOSED bar."""
@@ -317,77 +650,125 @@ def sleep_until(ts: int, pad_seconds: int = 2) -> None:
     if delay > 0:
         time.sleep(delay)
 
+# ---------------- Scan: fetch candles, evaluate all products at once ----------------
+def fetch_product_candles(p: dict) -> Optional[Tuple[str, np.ndarray]]:
+    """Fetch closed 15m candles for one product (runs in scan worker threads)."""
+    pid = p["product_id"]  # normalized (and base checked) in fetch_usd_products
+    candles = get_candles_15m(pid, bars_needed=300)
+    if len(candles) < MIN_BARS:
+        dbg(f"{pid} | insufficient candles ({len(candles)})")
+        return None
+    return pid, candles
+
+def scan_signals(products: List[dict]) -> List[Tuple[str, int, float]]:
+    """
+    Fetch candles concurrently, then evaluate RSI/SMA for all products as one matrix.
+    Returns (product_id, latest_bar_ts, rsi14) for each product whose signal fires,
+    in product (24h volume) order.
+    """
+    with ThreadPoolExecutor(max_workers=max(1, SCAN_WORKERS)) as pool:
+        fetched = [f for f in pool.map(fetch_product_candles, products) if f]
+    if not fetched:
+        return []
+
+    width = max(len(c) for _, c in fetched)
+    closes = np.full((len(fetched), width), np.nan)
+    counts = np.empty(len(fetched), dtype=np.int64)
+    for i, (_, candles) in enumerate(fetched):
+        closes[i, width - len(candles):] = candles[:, 4]
+        counts[i] = len(candles)
+
+    sma60 = sma(closes, 60)
+    sma240 = sma(closes, 240)
+    trend = sma60 < sma240
+
+    # Prune: RSI only matters where the trend filter passes (DEBUG computes it for every row).
+    rows = np.arange(len(fetched)) if DEBUG else np.flatnonzero(trend)
+    rsi14 = np.full(len(fetched), np.nan)
+    if len(rows):
+        rsi14[rows] = rsi_wilder_14(closes[rows], counts[rows], 14)
+    signal = trend & (rsi14 <= 30.0)
+
+    signals: List[Tuple[str, int, float]] = []
+    for i, (pid, candles) in enumerate(fetched):
+        latest_bar_ts = int(candles[-1, 0])  # should be the start time of the last CLOSED bar
+        # per-asset visibility (guarded here so the f-string isn't built per product when DEBUG is off)
+        if DEBUG:
+            dbg(
+                f"{pid} | bar={fmt_ts(latest_bar_ts)} | close={candles[-1, 4]:.8f} | "
+                f"RSI14={rsi14[i]:.2f} | SMA60={sma60[i]:.8f} | SMA240={sma240[i]:.8f} | "
+                f"candles={len(candles)} | signal={bool(signal[i])}"
+            )
+        if signal[i]:
+            signals.append((pid, latest_bar_ts, float(rsi14[i])))
+    return signals
+
 # ---------------- Main perpetual loop ----------------
 def main():
     buy_pct = D(BUY_PCT_STR) if BUY_PCT_STR else D("0.05")
-    usd_amt_fixed = D(BUY_USD_STR)  # ignored if buy_pct > 0
+    usd_amt_fixed = max(D(BUY_USD_STR), D("0"))  # ignored if buy_pct > 0; clamped once here
 
     mode = 'PCT' if buy_pct > 0 else 'USD'
     log(f"Started LIVE | mode={mode} | buy_pct={buy_pct} | quote={QUOTE} | no caps/limits | closed_only={STRICT_CLOSED_ONLY}")
-    pf = ensure_portfolio_uuid()
 
-    products: List[dict] = []
-    products_last_refresh = 0
+    # The portfolio lookup doesn't depend on the catalog, so overlap the two startup round-trips.
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        pf_future = pool.submit(ensure_portfolio_uuid)
+        products: List[dict] = fetch_usd_products()
+        pf = pf_future.result()
+    product_ids = {p["product_id"] for p in products}
+    product_meta = build_product_meta(products)
+    products_last_refresh = int(time.time())
+    log(f"Products refreshed: {len(products)} USD markets")
+
+    # Boundary of the next bar to scan; advanced one bar per cycle so an overrunning cycle
+    # catches up on the following bar instead of silently jumping past it.
+    next_boundary = next_bar_epoch()
 
     while True:
         # refresh USD products if needed
         now = int(time.time())
         if not products or (now - products_last_refresh) >= PRODUCT_REFRESH_SECS:
             products = fetch_usd_products()
+            product_ids = {p["product_id"] for p in products}
+            product_meta = build_product_meta(products)
+            get_product_meta.cache_clear()
+            for pid in [pid for pid in _CANDLE_CACHE if pid not in product_ids]:
+                del _CANDLE_CACHE[pid]
             products_last_refresh = now
             log(f"Products refreshed: {len(products)} USD markets")
 
         # Wait for the next bar boundary; candles function will use last CLOSED bar
-        boundary = next_bar_epoch(now)
-        sleep_until(boundary, pad_seconds=3)
+        now = int(time.time())
+        if now >= next_boundary + FIFTEEN_MIN:
+            latest = _bucket(now)
+            log(f"Cycle overran; skipped {(latest - next_boundary) // FIFTEEN_MIN} bar(s), scanning latest")
+            next_boundary = latest
+        sleep_until(next_boundary, pad_seconds=3)
+        next_boundary += FIFTEEN_MIN
 
         cycle_start = int(time.time())
-        total_signals = 0
         total_buys = 0
 
-        for p in products:
-            pid  = str(_get(p, "product_id") or "")
-            base = str(_get(p, "base_currency_id") or _get(p, "base_currency") or "").upper()
-            if not pid or not base:
-                continue
-
-            candles = get_candles_15m(pid, bars_needed=300)
-            if len(candles) < 240 + 14 + 1:
-                dbg(f"{pid} | insufficient candles ({len(candles)})")
-                continue
+        signals = scan_signals(products)
+        total_signals = len(signals)
 
-            closes = [c[4] for c in candles]
-            latest_bar_ts = candles[-1][0]  # should be the start time of the last CLOSED bar
-            latest_close = closes[-1]
-
-            rsi14 = rsi_wilder_14(closes, 14)
-            sma60 = sma(closes, 60)
-            sma240 = sma(closes, 240)
-            if rsi14 is None or sma60 is None or sma240 is None:
-                dbg(f"{pid} | metrics unavailable rsi14={rsi14} sma60={sma60} sma240={sma240}")
-                continue
-
-            cond = (rsi14 <= 30.0) and (sma60 < sma240)
-
-            # per-asset visibility
-            dbg(
-                f"{pid} | bar={fmt_ts(latest_bar_ts)} | close={latest_close:.8f} | "
-                f"RSI14={rsi14:.2f} | SMA60={sma60:.8f} | SMA240={sma240:.8f} | "
-                f"candles={len(candles)} | signal={cond}"
-            )
-
-            if not cond:
-                continue
-
-            total_signals += 1
+        # Balances fetched once per cycle (only if something fired), then
+        # decremented locally per sized order so sizing tracks what is left.
+        quote_bals: Optional[Dict[str, Decimal]] = None
+        orders: List[Tuple[str, Decimal, Optional[int]]] = []
 
+        for pid, latest_bar_ts, rsi14 in signals:
             # Size: 5% of *current* available USD per qualifying asset (no global caps)
-            meta = get_product_meta(pid)
-            quote_bal = get_quote_available(meta["quote_ccy"])
+            meta = product_meta.get(pid) or get_product_meta(pid)
+            qccy = str(meta["quote_ccy"]).upper()
+            if quote_bals is None:
+                quote_bals = get_available_balances()
+            quote_bal = quote_bals.get(qccy, D("0"))
             if buy_pct > 0:
                 usd_amt = round_to_inc(quote_bal * buy_pct, meta["quote_inc"])
             else:
-                usd_amt = round_to_inc(D(max(usd_amt_fixed, D("0"))), meta["quote_inc"])
+                usd_amt = round_to_inc(usd_amt_fixed, meta["quote_inc"])
 
             if usd_amt <= 0:
                 log(f"{pid} | Notional rounds to 0 (quote_bal={quote_bal}, pct={buy_pct}); skipping.")
@@ -400,13 +781,16 @@ def main():
                 f"{pid} | SIGNAL ✅ | {fmt_ts(latest_bar_ts)} | "
                 f"RSI14={rsi14:.2f} <= 30 and SMA60<SMA240 | buy_notional=${usd_amt}"
             )
-            try:
-                place_market_buy(pid, usd_amt, pf)
-                total_buys += 1
-            except Exception:
-                pass
-
-            time.sleep(0.05)  # gentle pacing
+            orders.append((pid, usd_amt, meta["quote_dec"]))
+            quote_bals[qccy] = max(D("0"), quote_bal - usd_amt)
+
+        # Orders are independent; submit them together (PRIVATE_RL still paces the POSTs).
+        if orders:
+            with ThreadPoolExecutor(max_workers=max(1, min(ORDER_WORKERS, len(orders)))) as pool:
+                futures = [pool.submit(place_market_buy, pid, amt, pf, qdec) for pid, amt, qdec in orders]
+                for fut in as_completed(futures):
+                    if fut.exception() is None:  # place_market_buy logs every failure, retry path included
+                        total_buys += 1
 
         took = int(time.time()) - cycle_start
         log(f"Bar complete | signals={total_signals} | buys={total_buys} | cycle_time={took}s")